@@ -1,87 +1,135 @@
+import numpy as np
+
+# --- Thresholds ---
+VELOCITY_THRESHOLD_IDLE = 0.05  # Much higher - only truly moving dogs exceed this
+VELOCITY_THRESHOLD_WALK = 0.15  # Walking threshold (higher to distinguish from running)
+JUMP_VELOCITY_THRESHOLD = -0.015 
+REAR_FRONT_VELOCITY_THRESHOLD = -0.005  # Lowered threshold for rearing detection
+TAIL_VARIANCE_THRESHOLD = 9.0  # Threshold for tail wagging (std dev of tail angle)
+TAIL_OSCILLATION_THRESHOLD = 25  # Min oscillations in window to indicate wagging
+LEG_STRIDE_THRESHOLD = 15.0  # Variance in leg angles - high indicates running
+REAR_PAW_HEIGHT_DIFF = 0.3  # Front paws this far above rear paws counts as rearing
+
+# Integer action codes used by recognize_action_batch; ACTION_LABELS maps them back to strings
+ACTION_LABELS = (
+    "idle", "jumping", "rearing", "walking", "running",
+    "sitting", "standing", "standing_on_two_legs", "lying",
+    "sitting_wagging", "standing_wagging", "standing_on_two_legs_wagging", "lying_wagging",
+)
+IDLE, JUMPING, REARING, WALKING, RUNNING, SITTING, STANDING, STANDING_ON_TWO_LEGS, LYING = range(9)
+_WAGGING_OFFSET = ACTION_LABELS.index("sitting_wagging") - SITTING  # pose code + offset -> "<pose>_wagging"
+
+# Column order of the features array taken by recognize_action_batch
+ACTION_FEATURES = (
+    'avg_velocity',
+    'centroid_vertical_velocity',
+    'front_paws_vertical_velocity',
+    'tail_angle_variance',
+    'tail_oscillation_count',
+    'leg_angle_variance',
+    'front_left_leg_angle',
+    'front_right_leg_angle',
+    'rear_left_leg_angle',
+    'rear_right_leg_angle',
+    'bbox_height',
+    'bbox_width',
+)
+
+
 def recognize_action(features, keypoints_norm):
     """
-    features: dict of angles, bbox info, and motion metrics
+    features: FrameFeatures with angles, bbox info, and motion metrics
     keypoints_norm: normalized keypoints centered on box
     """
 
     if features is None or keypoints_norm is None:
         return "unknown"
-        
-    # --- Thresholds ---
-    VELOCITY_THRESHOLD_IDLE = 0.05  # Much higher - only truly moving dogs exceed this
-    VELOCITY_THRESHOLD_WALK = 0.15  # Walking threshold (higher to distinguish from running)
-    JUMP_VELOCITY_THRESHOLD = -0.015 
-    REAR_FRONT_VELOCITY_THRESHOLD = -0.005  # Lowered threshold for rearing detection
-    TAIL_VARIANCE_THRESHOLD = 9.0  # Threshold for tail wagging (std dev of tail angle)
-    TAIL_OSCILLATION_THRESHOLD = 25  # Min oscillations in window to indicate wagging
-    LEG_STRIDE_THRESHOLD = 15.0  # Variance in leg angles - high indicates running
-    
-    avg_vel = features.get('avg_velocity', 0)
-    centroid_vy = features.get('centroid_vertical_velocity', 0)
-    front_vy = features.get('front_paws_vertical_velocity', 0)
-    tail_variance = features.get('tail_angle_variance', 0)
-    tail_oscillations = features.get('tail_oscillation_count', 0)
-    leg_stride_var = features.get('leg_angle_variance', 0)
-    
-    fl_angle = features['front_left_leg_angle']
-    fr_angle = features['front_right_leg_angle']
-    rl_angle = features['rear_left_leg_angle']
-    rr_angle = features['rear_right_leg_angle']
-    bbox_h = features['bbox_height']
-    bbox_w = features['bbox_width']
+
+    # --- 1. Determine Dynamic High-Priority Actions ---
+    # Each check only reads the features it needs, so early returns skip the rest
+    if features.centroid_vertical_velocity < JUMP_VELOCITY_THRESHOLD:
+        return "jumping"
     
-    height_ratio = bbox_h / (bbox_w + 1e-6)
     front_paws_y = (keypoints_norm[0][1] + keypoints_norm[6][1]) / 2 
     rear_paws_y = (keypoints_norm[3][1] + keypoints_norm[9][1]) / 2  
     
     # Check for rearing pose: front paws much higher than rear paws
     paw_height_diff = rear_paws_y - front_paws_y  # Positive means rear paws are lower
-
-    # --- 1. Determine Dynamic High-Priority Actions ---
-    if centroid_vy < JUMP_VELOCITY_THRESHOLD:
-        return "jumping"
     
     # Rearing: detect either by motion (velocity) OR by pose (front paws very high)
-    if front_vy < REAR_FRONT_VELOCITY_THRESHOLD or paw_height_diff > 0.3:
+    if (features.front_paws_vertical_velocity < REAR_FRONT_VELOCITY_THRESHOLD
+            or paw_height_diff > REAR_PAW_HEIGHT_DIFF):
         return "rearing"
         
     # --- 2. Determine Motion State ---
-    motion = "idle"
+    avg_vel = features.avg_velocity
     if avg_vel > VELOCITY_THRESHOLD_IDLE:
         # Use both velocity AND leg stride patterns to distinguish walking from running
         # Running: high velocity + high leg angle variance (rapid strides)
         # Walking: moderate velocity + lower leg angle variance
-        if avg_vel > VELOCITY_THRESHOLD_WALK and leg_stride_var > LEG_STRIDE_THRESHOLD:
-            motion = "running"  # Both high velocity AND rapid strides
-        else:
-            motion = "walking"
+        if avg_vel > VELOCITY_THRESHOLD_WALK and features.leg_angle_variance > LEG_STRIDE_THRESHOLD:
+            return "running"  # Both high velocity AND rapid strides
+        return "walking"
         
     # --- 3. Determine Primary Pose (Only relevant if Idle) ---
-    pose = "unknown"
-    # Detect tail wagging: both variance AND oscillation count should be high
-    is_tail_wagging = (tail_variance > TAIL_VARIANCE_THRESHOLD and 
-                       tail_oscillations > TAIL_OSCILLATION_THRESHOLD)
+    fl_angle = features.front_left_leg_angle
+    fr_angle = features.front_right_leg_angle
+    rl_angle = features.rear_left_leg_angle
+    rr_angle = features.rear_right_leg_angle
     
-    if motion == "idle":
-        if (rl_angle < 70 or rr_angle < 70) and fl_angle > 60 and fr_angle > 60:
-            pose = "sitting"
-        elif rl_angle > 80 and rr_angle > 80 and fl_angle > 80 and fr_angle > 80:
-            pose = "standing"
-        elif rl_angle > 80 and rr_angle > 80 and (rear_paws_y + abs(front_paws_y)) > 0.6 and height_ratio > 1.5:
-            pose = "standing_on_two_legs"
-        elif rl_angle < 40 and rr_angle < 40 and fl_angle < 50 and fr_angle < 50:
-            pose = "lying"
+    if (rl_angle < 70 or rr_angle < 70) and fl_angle > 60 and fr_angle > 60:
+        pose = "sitting"
+    elif rl_angle > 80 and rr_angle > 80 and fl_angle > 80 and fr_angle > 80:
+        pose = "standing"
+    elif (rl_angle > 80 and rr_angle > 80 and (rear_paws_y + abs(front_paws_y)) > 0.6
+            and features.bbox_height / (features.bbox_width + 1e-6) > 1.5):
+        pose = "standing_on_two_legs"
+    elif rl_angle < 40 and rr_angle < 40 and fl_angle < 50 and fr_angle < 50:
+        pose = "lying"
+    else:
+        return "idle"
 
     # --- 4. Construct Label ---
-    if motion != "idle":
-        return motion
-    
     # If idle, add tail wagging info to pose
-    if pose == "unknown":
-        return "idle"
-    else:
-        if is_tail_wagging:
-            return f"{pose}_wagging"
-        else:
-            return pose
+    # Detect tail wagging: both variance AND oscillation count should be high
+    if (features.tail_angle_variance > TAIL_VARIANCE_THRESHOLD and
+            features.tail_oscillation_count > TAIL_OSCILLATION_THRESHOLD):
+        return f"{pose}_wagging"
+    return pose
+
+
+def recognize_action_batch(features_arr, kpts_arr):
+    """
+    Vectorized recognize_action over N frames.
+    features_arr: [N, len(ACTION_FEATURES)] array, columns in ACTION_FEATURES order
+    kpts_arr: [N, 24, 2] normalized keypoints
+    Returns an [N] int array of action codes (see ACTION_LABELS).
+    """
+    (avg_vel, centroid_vy, front_vy, tail_variance, tail_oscillations, leg_stride_var,
+     fl_angle, fr_angle, rl_angle, rr_angle, bbox_h, bbox_w) = np.asarray(features_arr).T
+
+    height_ratio = bbox_h / (bbox_w + 1e-6)
+    front_paws_y = (kpts_arr[:, 0, 1] + kpts_arr[:, 6, 1]) / 2
+    rear_paws_y = (kpts_arr[:, 3, 1] + kpts_arr[:, 9, 1]) / 2
+    paw_height_diff = rear_paws_y - front_paws_y
+
+    # Pose, first matching rule wins (only used when idle)
+    pose = np.select(
+        [
+            ((rl_angle < 70) | (rr_angle < 70)) & (fl_angle > 60) & (fr_angle > 60),
+            (rl_angle > 80) & (rr_angle > 80) & (fl_angle > 80) & (fr_angle > 80),
+            (rl_angle > 80) & (rr_angle > 80) & ((rear_paws_y + np.abs(front_paws_y)) > 0.6) & (height_ratio > 1.5),
+            (rl_angle < 40) & (rr_angle < 40) & (fl_angle < 50) & (fr_angle < 50),
+        ],
+        [SITTING, STANDING, STANDING_ON_TWO_LEGS, LYING],
+        default=IDLE,
+    )
+    is_tail_wagging = (tail_variance > TAIL_VARIANCE_THRESHOLD) & (tail_oscillations > TAIL_OSCILLATION_THRESHOLD)
+    pose = np.where(is_tail_wagging & (pose != IDLE), pose + _WAGGING_OFFSET, pose)
 
+    # Motion state, then the high-priority dynamic actions override in increasing priority
+    is_running = (avg_vel > VELOCITY_THRESHOLD_WALK) & (leg_stride_var > LEG_STRIDE_THRESHOLD)
+    codes = np.where(avg_vel > VELOCITY_THRESHOLD_IDLE, np.where(is_running, RUNNING, WALKING), pose)
+    codes[(front_vy < REAR_FRONT_VELOCITY_THRESHOLD) | (paw_height_diff > REAR_PAW_HEIGHT_DIFF)] = REARING
+    codes[centroid_vy < JUMP_VELOCITY_THRESHOLD] = JUMPING
+    return codes
@@ -1,17 +1,33 @@
 import json
+from collections import deque
+from operator import attrgetter
 from feature_extraction import FeatureExtractor
-from action_classification import recognize_action
+from action_classification import (
+    ACTION_FEATURES, ACTION_LABELS, RUNNING, WALKING, recognize_action_batch,
+)
 import numpy as np
 
+# Frame table columns are the classifier inputs; these are the ones reported per frame
+_VEL = ACTION_FEATURES.index('avg_velocity')
+_TAIL_VAR = ACTION_FEATURES.index('tail_angle_variance')
+_TAIL_OSC = ACTION_FEATURES.index('tail_oscillation_count')
+_CENTROID_VY = ACTION_FEATURES.index('centroid_vertical_velocity')
+_LEG_VAR = ACTION_FEATURES.index('leg_angle_variance')
+_feature_row = attrgetter(*ACTION_FEATURES)  # FrameFeatures -> tuple in ACTION_FEATURES order
+
+
 def analyze_behavior(results):
     """Generate detailed behavioral analysis for LLM processing"""
     
     extractor = FeatureExtractor(window_size=60)
-    motion_history = []
     MOTION_BUFFER_SIZE = 5
+    motion_history = deque(maxlen=MOTION_BUFFER_SIZE)
     
-    frame_actions = []
-    action_metadata = {}
+    # Columnar frame table, classified in one batch once the stream is consumed
+    numeric = np.empty((1024, len(ACTION_FEATURES)), dtype=np.float32)
+    keypoints = np.empty((1024, 24, 2), dtype=np.float32)
+    frame_indices = np.empty(1024, dtype=np.int64)
+    n_frames = 0
     
     print("Analyzing behavior...")
     
@@ -19,76 +35,97 @@ def analyze_behavior(results):
         features, kpts_norm = extractor.update(result)
         
         if features is not None:
-            action = recognize_action(features, kpts_norm)
-            
-            # Temporal filtering
-            if action == "running":
-                motion_history.append("running")
-                if len(motion_history) > MOTION_BUFFER_SIZE:
-                    motion_history.pop(0)
-                if len(motion_history) < MOTION_BUFFER_SIZE:
-                    action = "walking"
-            else:
-                motion_history = []
-            
             # Store frame-by-frame data
-            frame_actions.append({
-                "frame": idx,
-                "action": action,
-                "velocity": float(features.get('avg_velocity', 0)),
-                "tail_variance": float(features.get('tail_angle_variance', 0)),
-                "is_tail_wagging": bool(features.get('tail_angle_variance', 0) > 9.0 and 
-                                       features.get('tail_oscillation_count', 0) > 10),
-                "centroid_vertical_velocity": float(features.get('centroid_vertical_velocity', 0)),
-                "leg_angle_variance": float(features.get('leg_angle_variance', 0)),
-            })
+            if n_frames == len(numeric):
+                numeric = np.concatenate((numeric, np.empty_like(numeric)))
+                keypoints = np.concatenate((keypoints, np.empty_like(keypoints)))
+                frame_indices = np.concatenate((frame_indices, np.empty_like(frame_indices)))
+            numeric[n_frames] = _feature_row(features)
+            keypoints[n_frames] = kpts_norm
+            frame_indices[n_frames] = idx
+            n_frames += 1
+        
+        # Release this frame's tensors before the stream yields the next one
+        del result
+    
+    numeric = numeric[:n_frames]
+    codes = recognize_action_batch(numeric, keypoints[:n_frames])
+    
+    # Temporal filtering: a run of "running" only counts once it lasts MOTION_BUFFER_SIZE frames
+    for i in range(n_frames):
+        if codes[i] == RUNNING:
+            motion_history.append(RUNNING)
+            if len(motion_history) < MOTION_BUFFER_SIZE:
+                codes[i] = WALKING
+        else:
+            motion_history.clear()
     
-    # Analyze action segments and transitions
+    is_tail_wagging = (numeric[:, _TAIL_VAR] > 9.0) & (numeric[:, _TAIL_OSC] > 10)
+    
+    # Analyze action segments and transitions: a segment starts wherever the code changes
     action_segments = []
-    current_action = None
-    segment_start = 0
-    
-    for i, frame_data in enumerate(frame_actions):
-        if frame_data['action'] != current_action:
-            if current_action is not None:
-                action_segments.append({
-                    "action": current_action,
-                    "start_frame": segment_start,
-                    "end_frame": i - 1,
-                    "duration_frames": i - segment_start,
-                    "duration_seconds": (i - segment_start) / 30  # Assuming 30 fps
-                })
-            current_action = frame_data['action']
-            segment_start = i
-    
-    # Don't forget the last segment
-    if current_action is not None:
-        action_segments.append({
-            "action": current_action,
-            "start_frame": segment_start,
-            "end_frame": len(frame_actions) - 1,
-            "duration_frames": len(frame_actions) - segment_start,
-            "duration_seconds": (len(frame_actions) - segment_start) / 30
-        })
-    
-    # Calculate statistics per action
+    if n_frames > 0:
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+        ends = np.append(starts[1:], n_frames)
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            action_segments.append({
+                "action": ACTION_LABELS[codes[start]],
+                "start_frame": start,
+                "end_frame": end - 1,
+                "duration_frames": end - start,
+                "duration_seconds": (end - start) / 30  # Assuming 30 fps
+            })
+    
+    # Calculate statistics per action as grouped reductions over the codes
+    n_actions = len(ACTION_LABELS)
+    velocities = numeric[:, _VEL].astype(np.float64)
+    counts = np.bincount(codes, minlength=n_actions)
+    vel_sums = np.bincount(codes, weights=velocities, minlength=n_actions)
+    vel_mins = np.full(n_actions, np.inf)
+    vel_maxs = np.full(n_actions, -np.inf)
+    np.minimum.at(vel_mins, codes, velocities)
+    np.maximum.at(vel_maxs, codes, velocities)
+    wag_counts = np.bincount(codes[is_tail_wagging], minlength=n_actions)
+    
+    _, first_seen = np.unique(codes, return_index=True)
     action_stats = {}
-    for action_type in set(f['action'] for f in frame_actions):
-        action_frames = [f for f in frame_actions if f['action'] == action_type]
-        velocities = [f['velocity'] for f in action_frames]
-        tail_wags = [f for f in action_frames if f['is_tail_wagging']]
-        
+    for k in codes[np.sort(first_seen)].tolist():
+        action_type = ACTION_LABELS[k]
+        count = int(counts[k])
+        wags = int(wag_counts[k])
         action_stats[action_type] = {
-            "total_frames": len(action_frames),
-            "percentage": f"{(len(action_frames) / len(frame_actions) * 100):.1f}%",
-            "avg_velocity": f"{np.mean(velocities):.4f}",
-            "velocity_range": f"{np.min(velocities):.4f} - {np.max(velocities):.4f}",
-            "tail_wagging_frames": len(tail_wags),
-            "tail_wagging_percentage": f"{(len(tail_wags) / len(action_frames) * 100):.1f}%"
+            "total_frames": count,
+            "percentage": f"{(count / n_frames * 100):.1f}%",
+            "avg_velocity": f"{(vel_sums[k] / count):.4f}",
+            "velocity_range": f"{vel_mins[k]:.4f} - {vel_maxs[k]:.4f}",
+            "tail_wagging_frames": wags,
+            "tail_wagging_percentage": f"{(wags / count * 100):.1f}%"
+        }
+    
+    # Per-frame records are only materialized here, for the JSON output
+    frame_actions = [
+        {
+            "frame": frame,
+            "action": ACTION_LABELS[code],
+            "velocity": vel,
+            "tail_variance": tail_var,
+            "is_tail_wagging": wagging,
+            "centroid_vertical_velocity": centroid_vy,
+            "leg_angle_variance": leg_var,
         }
+        for frame, code, vel, tail_var, wagging, centroid_vy, leg_var in zip(
+            frame_indices[:n_frames].tolist(),
+            codes.tolist(),
+            numeric[:, _VEL].tolist(),
+            numeric[:, _TAIL_VAR].tolist(),
+            is_tail_wagging.tolist(),
+            numeric[:, _CENTROID_VY].tolist(),
+            numeric[:, _LEG_VAR].tolist(),
+        )
+    ]
     
     # Generate behavior narrative
-    total_frames = len(frame_actions)
+    total_frames = n_frames
     video_duration = total_frames / 30  # Assuming 30 fps
     
     behavior_summary = {
@@ -12,7 +12,9 @@ Usage:
 """
 
 import os
-from typing import Dict, Any
+import queue
+import threading
+from typing import Dict, Any, Iterable, Iterator
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -23,6 +25,60 @@ from llm_analyzer import analyze
 
 print("test")
 
+PREFETCH_FRAMES = 32  # YOLO results buffered ahead of feature extraction
+
+_STREAM_END = object()
+
+
+class _StreamError:
+    """Carries an exception raised by the producer thread over to the consumer."""
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _prefetch(results: Iterable, maxsize: int = PREFETCH_FRAMES) -> Iterator:
+    """
+    Iterate `results` on a background thread, keeping up to `maxsize` items ready.
+    
+    Lets YOLO inference (GPU, releases the GIL) run ahead of the CPU-bound
+    behavior analysis instead of alternating with it.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        # Bounded put that gives up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        try:
+            for item in results:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_StreamError(e))
+            return
+        put(_STREAM_END)
+    
+    threading.Thread(target=produce, name="yolo-prefetch", daemon=True).start()
+    
+    try:
+        while True:
+            item = buffer.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, _StreamError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
 def run_pipeline(video_path: str) -> Dict[str, Any]:
     """
     Complete end-to-end pipeline: video → LLM analysis
@@ -51,24 +107,28 @@ def run_pipeline(video_path: str) -> Dict[str, Any]:
     except Exception as e:
         raise RuntimeError(f"Inference failed: {e}")
     
-    if results is None or len(results) == 0:
+    if results is None:
         raise RuntimeError("No inference results returned")
     
-    print(f"   ✓ Inference complete ({len(results)} frames)")
+    # Frames are produced lazily and consumed by the behavior analysis below
+    print("   ✓ Inference stream ready")
     
     
     # ====== STEP 2: BEHAVIOR ANALYSIS ======
     print("[2/4] Generating behavior analysis...")
     
     try:
-        # Use analyze_behavior_internal to get raw analysis
-        behavior_dict = analyze_behavior(results)
+        # Inference keeps producing frames on a background thread while they are analyzed
+        behavior_dict = analyze_behavior(_prefetch(results))
     except Exception as e:
         raise RuntimeError(f"Behavior analysis failed: {e}")
     
     if behavior_dict is None:
         raise RuntimeError("Behavior analysis returned None")
     
+    if behavior_dict['video_info']['total_frames'] == 0:
+        raise RuntimeError("No inference results returned")
+    
     print(f"   ✓ Analysis complete ({behavior_dict['video_info']['total_frames']} frames)")
     
     
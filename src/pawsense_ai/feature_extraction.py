@@ -1,5 +1,47 @@
+import math
+from dataclasses import dataclass
+
 import numpy as np
-import torch
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the kernels below run as plain Python without it
+    njit = None
+
+# Keypoint indices. Legs are ordered front_left, front_right, rear_left, rear_right;
+# each leg angle is measured at _LEG_B between _LEG_A (paw) and _LEG_C.
+_LEG_A = np.array([0, 6, 3, 9])
+_LEG_B = np.array([1, 7, 4, 10])
+_LEG_C = np.array([2, 8, 5, 11])
+_TAIL_START, _TAIL_END, _WITHERS = 12, 13, 22
+_LEFT_EYE, _RIGHT_EYE = 20, 21
+
+
+
+@dataclass(slots=True)
+class FrameFeatures:
+    """Features for one frame: pose from the frame itself, motion over the extractor window."""
+    front_left_leg_angle: float
+    front_right_leg_angle: float
+    rear_left_leg_angle: float
+    rear_right_leg_angle: float
+    tail_angle: float
+    paw_distance_front: float
+    paw_distance_rear: float
+    body_length: float
+    head_width: float
+    bbox_width: float
+    bbox_height: float
+    # Motion features stay 0 until the window holds at least two frames
+    avg_velocity: float = 0.0
+    tail_angle_variance: float = 0.0
+    tail_oscillation_count: int = 0
+    centroid_vertical_velocity: float = 0.0
+    front_paws_vertical_velocity: float = 0.0
+    rear_paws_vertical_velocity: float = 0.0
+    bbox_center_variance: float = 0.0
+    leg_angle_variance: float = 0.0
+    leg_angle_change_rate: float = 0.0
 
 
 def _process_result(result):
@@ -8,21 +50,136 @@ def _process_result(result):
     keypoints = result.keypoints
     if keypoints.xy.size()[0] == 0:
         return None, None
-    keypoints_xy = keypoints.xy[0]  # shape [24,2]
-    box_xywh = result.boxes.xywh[0]
-    cx, cy, w, h = box_xywh
-    bbox_norm = torch.tensor([cx/img_w, cy/img_h, w/img_w, h/img_h])
-    keypoints_norm = (keypoints_xy - torch.tensor([cx, cy])) / torch.tensor([w, h])
+    # Leave torch once here; everything downstream is float32 NumPy
+    # (half-precision inference would otherwise hand us float16)
+    keypoints_xy = keypoints.xy[0].cpu().numpy().astype(np.float32, copy=False)  # shape [24,2]
+    box_xywh = result.boxes.xywh[0].cpu().numpy().astype(np.float32, copy=False)
+    center, size = box_xywh[:2], box_xywh[2:]
+    img_wh = np.array((img_w, img_h), dtype=np.float32)
+    bbox_norm = np.concatenate((center / img_wh, size / img_wh))
+    keypoints_norm = (keypoints_xy - center) / size
     
     # print(keypoints_norm)
 
     return keypoints_norm, bbox_norm
 
 
-def _compute_angle(a, b, c):
+def _compute_angle_nb(ax, ay, bx, by, cx, cy):
+    # Angle at b in degrees. Scalar math: np.linalg.norm overhead dominates for 2-vectors.
+    bax = ax - bx
+    bay = ay - by
+    bcx = cx - bx
+    bcy = cy - by
+    norms = math.sqrt(bax * bax + bay * bay) * math.sqrt(bcx * bcx + bcy * bcy)
+    cos_theta = (bax * bcx + bay * bcy) / (norms + 1e-6)
+    return math.degrees(math.acos(min(max(cos_theta, -1.0), 1.0)))
+
+
+def _count_peaks_nb(values):
+    # Strict local maxima/minima; an explicit loop beats NumPy for window-sized arrays once compiled
+    peaks = 0
+    for i in range(1, len(values) - 1):
+        if values[i] > values[i-1] and values[i] > values[i+1]:
+            peaks += 1
+        elif values[i] < values[i-1] and values[i] < values[i+1]:
+            peaks += 1
+    return peaks
+
+
+def _var_nb(values):
+    # Population variance (np.var), two-pass
+    mean = 0.0
+    for v in values:
+        mean += v
+    mean /= len(values)
+    acc = 0.0
+    for v in values:
+        acc += (v - mean) * (v - mean)
+    return acc / len(values)
+
+
+def _motion_features_nb(kpts_ring, bbox_ring, head, count):
+    """
+    All motion features of FeatureExtractor in one pass over the ring buffers,
+    read oldest-to-newest in place. Needs count >= 2. Returns, in order:
+    avg_velocity, tail_angle_variance, tail_oscillation_count,
+    centroid_vertical_velocity, front_paws_vertical_velocity,
+    rear_paws_vertical_velocity, bbox_center_variance, leg_angle_variance,
+    leg_angle_change_rate
+    """
+    window = kpts_ring.shape[0]
+    start = (head - count) % window
+    n_steps = count - 1
+    
+    tail_angles = np.empty(count)
+    leg_angles = np.empty((count, 4))
+    centers_x = np.empty(count)
+    centers_y = np.empty(count)
+    vel_sum = 0.0
+    front_vy_sum = 0.0
+    rear_vy_sum = 0.0
+    leg_change_sum = 0.0
+    
+    prev = start
+    for t in range(count):
+        i = (start + t) % window
+        kp = kpts_ring[i]
+        tail_angles[t] = _compute_angle_nb(kp[_TAIL_END, 0], kp[_TAIL_END, 1],
+                                           kp[_TAIL_START, 0], kp[_TAIL_START, 1],
+                                           kp[_WITHERS, 0], kp[_WITHERS, 1])
+        for leg in range(4):
+            a, b, c = _LEG_A[leg], _LEG_B[leg], _LEG_C[leg]
+            leg_angles[t, leg] = _compute_angle_nb(kp[a, 0], kp[a, 1], kp[b, 0], kp[b, 1], kp[c, 0], kp[c, 1])
+        centers_x[t] = bbox_ring[i, 0]
+        centers_y[t] = bbox_ring[i, 1]
+        
+        if t > 0:
+            kp_prev = kpts_ring[prev]
+            for j in range(kp.shape[0]):
+                dx = kp[j, 0] - kp_prev[j, 0]
+                dy = kp[j, 1] - kp_prev[j, 1]
+                vel_sum += math.sqrt(dx * dx + dy * dy)
+            front_vy_sum += (kp[_LEG_A[0], 1] - kp_prev[_LEG_A[0], 1]) + (kp[_LEG_A[1], 1] - kp_prev[_LEG_A[1], 1])
+            rear_vy_sum += (kp[_LEG_A[2], 1] - kp_prev[_LEG_A[2], 1]) + (kp[_LEG_A[3], 1] - kp_prev[_LEG_A[3], 1])
+            for leg in range(4):
+                leg_change_sum += abs(leg_angles[t, leg] - leg_angles[t - 1, leg])
+        prev = i
+    
+    leg_var = 0.0
+    for leg in range(4):
+        leg_var += _var_nb(leg_angles[:, leg])
+    
+    return (
+        vel_sum / (n_steps * kpts_ring.shape[1]),
+        math.sqrt(_var_nb(tail_angles)),
+        _count_peaks_nb(tail_angles),
+        (centers_y[count - 1] - centers_y[0]) / n_steps,  # mean of the frame-to-frame diffs
+        0.5 * front_vy_sum / n_steps,
+        0.5 * rear_vy_sum / n_steps,
+        0.5 * (_var_nb(centers_x) + _var_nb(centers_y)),
+        leg_var / 4,
+        leg_change_sum / (n_steps * 4),
+    )
+
+
+if njit is not None:
+    _compute_angle_nb = njit(cache=True, fastmath=True, nogil=True)(_compute_angle_nb)
+    _count_peaks_nb = njit(cache=True, fastmath=True, nogil=True)(_count_peaks_nb)
+    _var_nb = njit(cache=True, fastmath=True, nogil=True)(_var_nb)
+    _motion_features_nb = njit(cache=True, fastmath=True, nogil=True)(_motion_features_nb)
+
+
+def _compute_angle(kp, a, b, c):
+    # Angle at keypoint b formed by keypoints a and c of one frame's kp [24,2]
+    return _compute_angle_nb(kp[a, 0], kp[a, 1], kp[b, 0], kp[b, 1], kp[c, 0], kp[c, 1])
+
+
+def _compute_angles_batch(a, b, c):
+    # a, b, c: [..., 2] -> angle at b for every point, [...]
     ba = a - b
     bc = c - b
-    cos_theta = np.dot(ba, bc) / (np.linalg.norm(ba)*np.linalg.norm(bc)+1e-6)
+    norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    cos_theta = np.einsum('...k,...k->...', ba, bc, dtype=np.float32) / (norms + 1e-6)
     return np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))
 
 def _extract_semantic_features(result):
@@ -30,150 +187,154 @@ def _extract_semantic_features(result):
         kpts_norm, bbox_norm = _process_result(result)
 
         if kpts_norm is None:
-            return None, None
+            return None, None, None
 
         # Example: kpts_norm [24,2], bbox_norm = [cx/img_w, cy/img_h, w/img_w, h/img_h]
-        features = {}
-        
         # Leg angles
-        features['front_left_leg_angle'] = _compute_angle(kpts_norm[0], kpts_norm[1], kpts_norm[2])
-        features['front_right_leg_angle'] = _compute_angle(kpts_norm[6], kpts_norm[7], kpts_norm[8])
-        features['rear_left_leg_angle'] = _compute_angle(kpts_norm[3], kpts_norm[4], kpts_norm[5])
-        features['rear_right_leg_angle'] = _compute_angle(kpts_norm[9], kpts_norm[10], kpts_norm[11])
-        
-        # Tail angle
-        features['tail_angle'] = _compute_angle(kpts_norm[13], kpts_norm[12], kpts_norm[22])  # tail_end, tail_start, withers
+        fl, fr, rl, rr = (_compute_angle(kpts_norm, a, b, c) for a, b, c in zip(_LEG_A, _LEG_B, _LEG_C))
         
-        # Body distances
-        features['paw_distance_front'] = np.linalg.norm(kpts_norm[0] - kpts_norm[6])
-        features['paw_distance_rear'] = np.linalg.norm(kpts_norm[3] - kpts_norm[9])
-        features['body_length'] = np.linalg.norm(kpts_norm[22] - kpts_norm[13])  # withers to tail_end
-        features['head_width'] = np.linalg.norm(kpts_norm[20] - kpts_norm[21])  # eyes
+        features = FrameFeatures(
+            front_left_leg_angle=fl,
+            front_right_leg_angle=fr,
+            rear_left_leg_angle=rl,
+            rear_right_leg_angle=rr,
+            # Tail angle
+            tail_angle=_compute_angle(kpts_norm, _TAIL_END, _TAIL_START, _WITHERS),
+            # Body distances
+            paw_distance_front=np.linalg.norm(kpts_norm[_LEG_A[0]] - kpts_norm[_LEG_A[1]]),
+            paw_distance_rear=np.linalg.norm(kpts_norm[_LEG_A[2]] - kpts_norm[_LEG_A[3]]),
+            body_length=np.linalg.norm(kpts_norm[_WITHERS] - kpts_norm[_TAIL_END]),
+            head_width=np.linalg.norm(kpts_norm[_LEFT_EYE] - kpts_norm[_RIGHT_EYE]),
+            # Bbox info
+            bbox_width=bbox_norm[2],
+            bbox_height=bbox_norm[3],
+        )
         
-        # Bbox info
-        features['bbox_width'] = bbox_norm[2]
-        features['bbox_height'] = bbox_norm[3]
-        
-        return features, kpts_norm
+        return features, kpts_norm, bbox_norm
 
 class FeatureExtractor:
     def __init__(self, window_size=60):
         self.window_size = window_size
-        self.history_buffer = []  # List of (kpts_norm, bbox_norm)
+        # Ring buffers of the last `window_size` frames: kpts_norm [24,2] and bbox_norm [4]
+        self._kpts_ring = np.empty((window_size, 24, 2), dtype=np.float32)
+        self._bbox_ring = np.empty((window_size, 4), dtype=np.float32)
+        self._head = 0   # next slot to write
+        self._count = 0  # number of valid frames
     
 
     def update(self, result):
         # 1. Extract static features and current normalized data
-        features, kpts_norm = _extract_semantic_features(result)
+        features, kpts_norm, bbox_norm = _extract_semantic_features(result)
         
         if kpts_norm is None:
             return features, kpts_norm
             
         # 2. Update buffer
-        kpts_flat = kpts_norm.numpy() # Convert to numpy for easier calc
-        # We need bbox_norm too, let's allow _extract_semantic_features to return it or extract again
-        # To avoid changing _extract_semantic_features signature too much, let's just re-extract here briefly or modify _extract_semantic_features to return it.
-        # Looking at _extract_semantic_features, it calls _process_result. Let's call _process_result directly to get bbox.
-        _, bbox_norm_tensor = _process_result(result)
-        bbox_flat = bbox_norm_tensor.numpy()
-        
-        self.history_buffer.append((kpts_flat, bbox_flat))
-        if len(self.history_buffer) > self.window_size:
-            self.history_buffer.pop(0)
+        self._kpts_ring[self._head] = kpts_norm
+        self._bbox_ring[self._head] = bbox_norm
+        self._head = (self._head + 1) % self.window_size
+        self._count = min(self._count + 1, self.window_size)
             
         # 3. Compute Motion Features if buffer has enough data
-        if len(self.history_buffer) >= 2:
+        # (FrameFeatures defaults them to 0 for the first frame)
+        if self._count >= 2:
             self._compute_motion_features(features)
-        else:
-            # Default values for first few frames
-            features['avg_velocity'] = 0.0
-            features['tail_angle_variance'] = 0.0
-            features['centroid_vertical_velocity'] = 0.0
-            features['front_paws_vertical_velocity'] = 0.0
             
         return features, kpts_norm
     
 
+    def _window(self):
+        # Oldest-to-newest view of the ring buffers. Only copies once the ring has wrapped.
+        if self._count < self.window_size:
+            return self._kpts_ring[:self._count], self._bbox_ring[:self._count]
+        if self._head == 0:
+            return self._kpts_ring, self._bbox_ring
+        h = self._head
+        kpts_seq = np.concatenate((self._kpts_ring[h:], self._kpts_ring[:h]))
+        bbox_seq = np.concatenate((self._bbox_ring[h:], self._bbox_ring[:h]))
+        return kpts_seq, bbox_seq
+
     def _compute_motion_features(self, features):
+        if njit is not None:
+            # Compiled kernel: same features, no window copy or intermediate arrays
+            (features.avg_velocity,
+             features.tail_angle_variance,
+             features.tail_oscillation_count,
+             features.centroid_vertical_velocity,
+             features.front_paws_vertical_velocity,
+             features.rear_paws_vertical_velocity,
+             features.bbox_center_variance,
+             features.leg_angle_variance,
+             features.leg_angle_change_rate) = _motion_features_nb(
+                self._kpts_ring, self._bbox_ring, self._head, self._count
+            )
+            return
+        
         # Extract sequences
-        kpts_seq = np.array([item[0] for item in self.history_buffer]) # [T, 24, 2]
-        bbox_seq = np.array([item[1] for item in self.history_buffer]) # [T, 4] (cx, cy, w, h)
+        kpts_seq, bbox_seq = self._window() # [T, 24, 2], [T, 4] (cx, cy, w, h)
+        # Keep the memory-bound reductions below in float32 (no-op for the ring buffers)
+        kpts_seq = np.ascontiguousarray(kpts_seq, dtype=np.float32)
+        
+        # Frame-to-frame keypoint displacement, computed once and shared by the
+        # velocity and paw reductions below
+        D = np.diff(kpts_seq, axis=0) # [T-1, 24, 2]
         
         # --- General Motion ---
         # Displacement between successive frames
-        diffs = np.linalg.norm(kpts_seq[1:] - kpts_seq[:-1], axis=2) # [T-1, 24]
-        avg_velocity = np.mean(diffs) # Average movement of all keypoints
-        features['avg_velocity'] = avg_velocity
+        diffs = np.sqrt(np.einsum('ijk,ijk->ij', D, D, dtype=np.float32)) # [T-1, 24]
+        avg_velocity = np.mean(diffs, dtype=np.float32) # Average movement of all keypoints
+        features.avg_velocity = avg_velocity
         
         # --- Tail Wagging ---
         # Track tail angle variance over window. 
         # We need to re-compute angles for previous frames or store them. 
         # Re-computing is safer than storing potentially huge dicts.
-        tail_angles = []
-        for i in range(len(kpts_seq)):
-            # indexes: 13=tail_end, 12=tail_start, 22=withers
-            kp = kpts_seq[i]
-            angle = _compute_angle(kp[13], kp[12], kp[22])
-            tail_angles.append(angle)
-        tail_angles = np.array(tail_angles)
+        tail_angles = _compute_angles_batch(
+            kpts_seq[:, _TAIL_END], kpts_seq[:, _TAIL_START], kpts_seq[:, _WITHERS]
+        )
         
         # Use std deviation instead of var for more intuitive threshold
-        features['tail_angle_variance'] = np.std(tail_angles)
-        features['tail_oscillation_count'] = self._count_peaks(tail_angles)
+        features.tail_angle_variance = np.std(tail_angles)
+        features.tail_oscillation_count = self._count_peaks(tail_angles)
         
         # --- Jumping ---
         # Vertical velocity of centroid (bbox[1] is cy). Positive y is down in image coords usually, 
         # so negative diff means moving UP.
-        centroid_y_seq = bbox_seq[:, 1]
-        vertical_diffs = centroid_y_seq[1:] - centroid_y_seq[:-1]
+        vertical_diffs = np.diff(bbox_seq[:, 1])
         # Average vertical velocity over last few frames
-        features['centroid_vertical_velocity'] = np.mean(vertical_diffs)
+        features.centroid_vertical_velocity = np.mean(vertical_diffs)
         
         # --- Rearing (Front paws vs Rear paws vertical movement) ---
-        # Front paws: 0 and 6 (left/right). Rear paws: 3 and 9.
-        # Average Y position of front paws
-        front_paws_y = (kpts_seq[:, 0, 1] + kpts_seq[:, 6, 1]) / 2
-        rear_paws_y = (kpts_seq[:, 3, 1] + kpts_seq[:, 9, 1]) / 2
-        
-        features['front_paws_vertical_velocity'] = np.mean(front_paws_y[1:] - front_paws_y[:-1])
-        features['rear_paws_vertical_velocity'] = np.mean(rear_paws_y[1:] - rear_paws_y[:-1])
+        # Vertical velocity of the average Y position of each paw pair
+        paws_vy = D[:, _LEG_A, 1]  # [T-1, 4]
+        features.front_paws_vertical_velocity = 0.5 * np.mean(paws_vy[:, 0] + paws_vy[:, 1])
+        features.rear_paws_vertical_velocity = 0.5 * np.mean(paws_vy[:, 2] + paws_vy[:, 3])
         
         # --- Idle Stability ---
         # Variance of body center
-        features['bbox_center_variance'] = np.var(bbox_seq[:, :2], axis=0).mean()
+        features.bbox_center_variance = np.var(bbox_seq[:, :2], axis=0).mean()
         
         # --- Leg Stride Pattern (for running vs walking detection) ---
         # Compute leg angle changes over time
-        leg_angles_seq = []
-        for i in range(len(kpts_seq)):
-            kp = kpts_seq[i]
-            fl = _compute_angle(kp[0], kp[1], kp[2])
-            fr = _compute_angle(kp[6], kp[7], kp[8])
-            rl = _compute_angle(kp[3], kp[4], kp[5])
-            rr = _compute_angle(kp[9], kp[10], kp[11])
-            leg_angles_seq.append([fl, fr, rl, rr])
-        
-        leg_angles_seq = np.array(leg_angles_seq)
+        leg_angles_seq = _compute_angles_batch(
+            kpts_seq[:, _LEG_A], kpts_seq[:, _LEG_B], kpts_seq[:, _LEG_C]
+        )  # [T, 4]
         
         # Compute variance in leg angles - high variance indicates rapid strides (running)
         # Low variance indicates steady walking
-        features['leg_angle_variance'] = np.var(leg_angles_seq, axis=0).mean()  # Average variance across all legs
+        features.leg_angle_variance = np.var(leg_angles_seq, axis=0).mean()  # Average variance across all legs
         
         # Also compute the rate of change of leg angles (stride frequency)
         leg_angle_diffs = np.abs(leg_angles_seq[1:] - leg_angles_seq[:-1])  # [T-1, 4]
-        features['leg_angle_change_rate'] = np.mean(leg_angle_diffs)  # Average change per frame
+        features.leg_angle_change_rate = np.mean(leg_angle_diffs)  # Average change per frame
 
     def _count_peaks(self, values):
         if len(values) < 3:
             return 0
-        peaks = 0
-        # Simple local maxima/minima
-        for i in range(1, len(values) - 1):
-            if values[i] > values[i-1] and values[i] > values[i+1]:
-                peaks += 1
-            elif values[i] < values[i-1] and values[i] < values[i+1]:
-                peaks += 1 # counting reversals/extremas
-        return peaks
+        # Strict local maxima/minima: the slope changes sign around values[i]
+        # (sign() rather than the raw product so tiny diffs can't underflow to 0)
+        d = np.sign(np.diff(np.asarray(values)))
+        return int(np.count_nonzero(d[:-1] * d[1:] < 0))
 
 
 
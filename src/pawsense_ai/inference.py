@@ -1,5 +1,20 @@
+import numpy as np
+import torch
 from ultralytics import YOLO
+
+_device = "cuda" if torch.cuda.is_available() else "cpu"
+_half = _device == "cuda"  # FP16 only pays off on GPU
+torch.backends.cudnn.benchmark = True  # frames of a video share one input size
+
+# Only pass half when it's on, so CPU runs don't trip version-specific arg handling
+_predict_kwargs = {"device": _device, "verbose": False}
+if _half:
+    _predict_kwargs["half"] = True
+
 model = YOLO("best.pt")
+model.fuse()
+# Warm up once at import so the first video doesn't pay the model/kernel setup cost
+model.predict(np.zeros((640, 640, 3), dtype=np.uint8), **_predict_kwargs)
 
 def infer(video_path):
 
@@ -7,6 +22,6 @@ def infer(video_path):
 
     # with open("results.pkl", "rb") as f:
     #     results = pickle.load(f)
-    results = model.predict(video_path, save=False, show=False)
+    # stream=True yields one result per frame instead of holding the whole video in memory
+    results = model.predict(video_path, save=False, show=False, stream=True, **_predict_kwargs)
     return results
-
@@ -6,26 +6,26 @@ import os
 
 client = Groq()
 
-def build_prompt(prompt_data) -> str:
-        """Build optimized prompt for behavior analysis."""
-        
-        prompt = f"""Analyze the following video behavior data and provide ONLY:
+# Fixed prompt text, built once at import; only the behavior report varies per call
+_PROMPT_HEAD = """Analyze the following video behavior data and provide ONLY:
 1. Emotional state (happy, anxious, calm, playful, etc.) with confidence score
 2. Key behavior patterns observed
 4. Health and wellbeing insights
 5. Actionable recommendations
 
 
-{prompt_data}
+"""
+
+_PROMPT_TAIL = """
 
 
 RESPOND IN THIS EXACT JSON FORMAT (valid JSON only, no markdown):
-{{
+{
     "emotional_states": [
-        {{
+        {
             "emotion": "emotion name",
             "confidence": X.XX
-        }}
+        }
     ],
     "behavior_patterns": [
         "pattern 1",
@@ -40,7 +40,7 @@ RESPOND IN THIS EXACT JSON FORMAT (valid JSON only, no markdown):
     ],
 
     "overall_wellbeing_score": XX.X
-}}
+}
 
 Important:
 - Ensure all confidence scores are between 0 and 1
@@ -51,23 +51,30 @@ Important:
 - Consider tail wagging as a positive engagement indicator
 - Provide actionable, specific recommendations"""
 
-        return prompt
-    
-
-def analyze(prompt_data) -> Dict[str, Any]:
-
-    system_prompt = '''You are an expert dog behavior analyst who will reply in VALID JSON ONLY.
+_SYSTEM_PROMPT = '''You are an expert dog behavior analyst who will reply in VALID JSON ONLY.
     - Only output valid JSON
 - No trailing commas 
 - Use double quotes for all keys and strings
 - No comments
 - No markdown'''
+
+# Strips trailing commas before a closing bracket/brace, which the model sometimes emits
+_TRAILING_COMMA_RE = re.compile(r',(\s*[\]}])')
+
+def build_prompt(prompt_data) -> str:
+        """Build optimized prompt for behavior analysis."""
+        
+        return _PROMPT_HEAD + str(prompt_data) + _PROMPT_TAIL
+    
+
+def analyze(prompt_data) -> Dict[str, Any]:
+
     user_prompt = build_prompt(prompt_data)
     chat_completion = client.chat.completions.create(
         messages=[
             {
                 "role": "system",
-                "content": system_prompt
+                "content": _SYSTEM_PROMPT
             },
             {
                 "role": "user",
@@ -81,7 +88,7 @@ def analyze(prompt_data) -> Dict[str, Any]:
     raw_json_string = chat_completion.choices[0].message.content
     print(raw_json_string)
 
-    clean_json = re.sub(r',(\s*[\]}])', r'\1', raw_json_string)
+    clean_json = _TRAILING_COMMA_RE.sub(r'\1', raw_json_string)
     response = json.loads(clean_json)
 
     return response